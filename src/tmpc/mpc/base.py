@@ -98,6 +98,7 @@ class MPCBase(LQR, metaclass=abc.ABCMeta):
 
         self.__pred_horizon = pred_horizon
 
+        # 实时状态作为 cvxpy 参数，优化问题满足 DPP 规则，重复求解时只需编译一次
         self.__real_time_state = cp.Parameter(self.state_dim)
         self.__state_series = cp.Variable(self.state_dim * (pred_horizon + 1))
         self.__input_series = cp.Variable(self.input_dim * pred_horizon)
@@ -42,6 +42,6 @@ class MPC(MPCBase):
 
     def __call__(self, real_time_state: np.ndarray) -> np.ndarray:
         self.real_time_state = real_time_state
-        self.problem.solve(solver=self.solver)
+        self.problem.solve(solver=self.solver, enforce_dpp=True)
 
         return self.input_ini.value
@@ -1,11 +1,51 @@
 import numpy as np
 import cvxpy as cp
-from functools import cache
+from functools import lru_cache
+from typing import Tuple
+from scipy.spatial import ConvexHull
 from .base import MPCBase
-from ..set import Polyhedron, support_fun, unit_cube
+from ..set import Polyhedron, unit_cube, convex_hull
 from .exception import *
 
 
+# 将数组转为字节串，作为下面缓存函数的键
+def _to_bytes(arr: np.ndarray) -> bytes:
+    return np.ascontiguousarray(arr, dtype=np.float64).tobytes()
+
+
+# A_k^0, A_k^1, ..., A_k^(n - 1) 组成的三维数组，已有前 m 个幂时用 A_k^m 左乘它们即得到后 m 个，
+# 只需 log(n) 次批量矩阵乘法
+def _matrix_powers(a: np.ndarray, n: int) -> np.ndarray:
+    powers = np.empty((n, *a.shape))
+    powers[0] = np.eye(a.shape[0])
+
+    m = 1
+    a_m = a
+    while m < n:
+        k = min(m, n - m)
+        powers[m : m + k] = a_m @ powers[:k]
+        a_m = a_m @ a_m
+        m = m + k
+
+    return powers
+
+
+# 对所有的 i 和所有方向 eta（etas 的每一行）求 h(eta, A^i @ S) = max_v eta @ A^i @ v，其中 v 为 S 的顶点，
+# 返回形状为 (幂的个数, 方向的个数) 的数组
+def _support_fun_powers(etas: np.ndarray, powers: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    return np.max(np.einsum("ej,ijk,vk->iev", etas, powers, vertices, optimize=True), axis=2)
+
+
+# 两组顶点（每行一个顶点）两两相加得到闵可夫斯基和的顶点，并只保留凸包上的点，防止顶点个数成倍增长
+def _minkowski_sum_vertices(vertices_1: np.ndarray, vertices_2: np.ndarray) -> np.ndarray:
+    vertices = (vertices_1[:, np.newaxis, :] + vertices_2[np.newaxis, :, :]).reshape(-1, vertices_1.shape[1])
+
+    if vertices.shape[1] == 1:
+        return np.array([[np.min(vertices)], [np.max(vertices)]])
+
+    return vertices[ConvexHull(vertices).vertices]
+
+
 class TubeBasedMPC(MPCBase):
     def __init__(
         self,
@@ -27,12 +67,25 @@ class TubeBasedMPC(MPCBase):
 
         self.__noise_set = noise_set
 
-        self.__tightened_state_set = state_set - self.disturbance_invariant_set
-        self.__tightened_input_set = input_set - self.k @ self.disturbance_invariant_set
+        l_mat_x, r_vec_x, l_mat_u, r_vec_u = _tightened_sets(
+            _to_bytes(self.a - self.b @ self.k),
+            _to_bytes(self.k),
+            _to_bytes(state_set.l_mat),
+            _to_bytes(state_set.r_vec),
+            _to_bytes(input_set.l_mat),
+            _to_bytes(input_set.r_vec),
+            _to_bytes(noise_set.l_mat),
+            _to_bytes(noise_set.r_vec),
+            self.state_dim,
+            self.input_dim,
+        )
+
+        self.__tightened_state_set = Polyhedron(l_mat_x, r_vec_x)
+        self.__tightened_input_set = Polyhedron(l_mat_u, r_vec_u)
 
     def __call__(self, real_time_state: np.ndarray) -> np.ndarray:
         self.real_time_state = real_time_state
-        self.problem.solve(solver=self.solver)
+        self.problem.solve(solver=self.solver, enforce_dpp=True)
 
         return self.input_ini.value - self.k @ (real_time_state - self.state_ini.value)
 
@@ -53,60 +106,116 @@ class TubeBasedMPC(MPCBase):
         return self.disturbance_invariant_set.contains(self.real_time_state - self.state_ini)
 
     @property
-    @cache
-    def disturbance_invariant_set(self, alpha=0.2, epsilon=0.001) -> Polyhedron:
-        alp = alpha
+    def disturbance_invariant_set(self) -> Polyhedron:
+        l_mat, r_vec = _disturbance_invariant_set(
+            _to_bytes(self.a - self.b @ self.k),
+            _to_bytes(self.__noise_set.l_mat),
+            _to_bytes(self.__noise_set.r_vec),
+            self.state_dim,
+        )
 
-        # 由于多次给集合左乘 A_k，且 A_k 可逆，可以提前求好 A_k 的逆并在下面的 计算 1、计算 2 中右乘 A_k 的逆，这里为了方便理解，没有这么做
-        # a_k_inv = npl.inv(self.a - self.b @ self.k)
-        a_k = self.a - self.b @ self.k
+        return Polyhedron(l_mat, r_vec)
 
-        a_k_s = np.eye(self.state_dim)
-        a_k_s_noise_set = self.__noise_set
-        sum_a_k_s_noise_set = self.__noise_set
-        alpha_noise_set = alp * self.__noise_set
 
-        while True:
-            if a_k_s_noise_set.subset_eq(alpha_noise_set):
-                break
+# 扰动不变集只由 A_k、噪声集合以及 alpha、epsilon 决定，这里以它们的字节串作为缓存的键，
+# 参数相同的控制器（例如调参时反复构造控制器）可以共享计算结果，返回扰动不变集的 H 表示
+@lru_cache(maxsize=32)
+def _disturbance_invariant_set(
+    a_k_bytes: bytes, l_mat_bytes: bytes, r_vec_bytes: bytes, state_dim: int, alpha=0.2, epsilon=0.001
+) -> Tuple[np.ndarray, np.ndarray]:
+    a_k = np.frombuffer(a_k_bytes).reshape(state_dim, state_dim)
+    noise_set = Polyhedron(np.frombuffer(l_mat_bytes).reshape(-1, state_dim), np.frombuffer(r_vec_bytes))
 
-            a_k_s = a_k @ a_k_s
+    # 集合 A_k^i @ W 的顶点即为 W 的顶点左乘 A_k^i（这里每行一个顶点），因此其支撑函数可以直接由顶点投影得到，
+    # 下面两个循环中的包含关系判断都不需要构造多面体或求解线性规划，并且可以对一批 i 同时计算
+    noise_vertices = noise_set.get_vertices()
+    # 这里用一个单位球的内接超正方体代替单位球
+    unit_cube_ = unit_cube(state_dim, 2 * epsilon / np.sqrt(state_dim))
 
-            # 计算 1 - - - - - - - - - - - - - - - - - - - #
-            # a_k_s_noise_set = a_k_s_noise_set @ a_k_inv
-            a_k_s_noise_set = a_k @ a_k_s_noise_set
-            # - - - - - - - - - - - - - - - - - - - - - - #
+    # 先计算 A_k 的前 n_powers 个幂，若不足以满足下面两个终止条件再加倍
+    n_powers = 16
 
-            sum_a_k_s_noise_set = sum_a_k_s_noise_set + a_k_s_noise_set
+    while True:
+        powers = _matrix_powers(a_k, n_powers)
 
-        alp = max(
-            [
-                support_fun(self.__noise_set.l_mat[i, :], a_k_s_noise_set) / a_k_s_noise_set.r_vec[i]
-                for i in range(self.__noise_set.n_edges)
-            ]
-        )
+        # 循环 1：alpha * W 与 W 的左矩阵相同，因此 A_k^s @ W 被包含于 alpha * W 等价于 max_i h(W_i, A_k^s @ W) / r_i <= alpha，
+        # 其中 W_i、r_i 为 W 的第 i 行，取第一个满足条件的 s，此时的最大值即为所求的 alpha
+        ratios = np.max(_support_fun_powers(noise_set.l_mat, powers, noise_vertices) / noise_set.r_vec, axis=1)
+        # 循环 2：从 s 开始第一个满足 A_k^m @ W 被包含于 unit_cube_ 的 m
+        in_unit_cube = np.all(_support_fun_powers(unit_cube_.l_mat, powers, noise_vertices) <= unit_cube_.r_vec, axis=1)
 
-        f_alpha_s_set = sum_a_k_s_noise_set / (1 - alp)
+        s_candidates = np.flatnonzero(ratios <= alpha)
+        if s_candidates.size > 0:
+            s = s_candidates[0]
+            m_candidates = np.flatnonzero(in_unit_cube[s:])
 
-        a_k_n = a_k_s
-        a_k_n_noise_set = a_k_s_noise_set
-        sum_a_k_n_noise_set = sum_a_k_s_noise_set
-        # 这里用一个单位球的内接超正方体代替单位球
-        unit_cube_ = unit_cube(self.state_dim, 2 * epsilon / np.sqrt(self.state_dim))
-
-        while True:
-            a_k_n = a_k @ a_k_n
-
-            if a_k_n_noise_set.subset_eq(unit_cube_):
+            # 最后还需要用到 A_k^(m + 1)
+            if m_candidates.size > 0 and s + m_candidates[0] + 1 < n_powers:
+                m = s + m_candidates[0]
                 break
 
-            # 计算 2 - - - - - - - - - - - - - - - - - - - #
-            # a_k_n_noise_set = a_k_n_noise_set @ a_k_inv
-            a_k_n_noise_set = a_k @ a_k_n_noise_set
-            # - - - - - - - - - - - - - - - - - - - - - - #
-
-            sum_a_k_n_noise_set = sum_a_k_n_noise_set + a_k_n_noise_set
-
-        disturbance_invariant_set = a_k_n @ f_alpha_s_set + sum_a_k_n_noise_set
-
-        return disturbance_invariant_set
+        n_powers = 2 * n_powers
+
+    alp = ratios[s]
+    a_k_s_list = powers[: s + 1]
+    a_k_n_list = powers[s + 1 : m + 1]
+    a_k_n = powers[m + 1]
+
+    # 闵可夫斯基和 sum(A_k^i @ W) 不逐次用多面体计算（每次都需要求解大量支撑函数），
+    # 而是由各项的顶点直接相加，最后只做一次凸包得到 H 表示
+    sum_a_k_s_vertices = noise_vertices
+    for a_k_i in a_k_s_list[1:]:
+        sum_a_k_s_vertices = _minkowski_sum_vertices(sum_a_k_s_vertices, noise_vertices @ a_k_i.T)
+
+    sum_a_k_n_vertices = sum_a_k_s_vertices
+    for a_k_i in a_k_n_list:
+        sum_a_k_n_vertices = _minkowski_sum_vertices(sum_a_k_n_vertices, noise_vertices @ a_k_i.T)
+
+    # a_k_n @ F_s / (1 - alpha) + sum(A_k^i @ W)，其中 a_k_n @ F_s / (1 - alpha) 展开为各项 a_k_n @ A_k^i @ W / (1 - alpha)
+    # 之和，逐项加入，每次只与 W 的顶点两两相加，避免两个顶点很多的凸包直接两两相加
+    sum_vertices = sum_a_k_n_vertices
+    for a_k_i in a_k_s_list:
+        sum_vertices = _minkowski_sum_vertices(sum_vertices, noise_vertices @ (a_k_n @ a_k_i).T / (1 - alp))
+
+    disturbance_invariant_set = convex_hull(sum_vertices)
+    disturbance_invariant_set.normalization()
+
+    return _read_only_h_rep(disturbance_invariant_set)
+
+
+# 收紧后的状态约束 X - Z 和输入约束 U - K @ Z（Z 为扰动不变集）只由 A_k、K 以及各个集合决定，
+# 与扰动不变集一样按字节串缓存，返回两个集合的 H 表示
+@lru_cache(maxsize=32)
+def _tightened_sets(
+    a_k_bytes: bytes,
+    k_bytes: bytes,
+    state_l_mat_bytes: bytes,
+    state_r_vec_bytes: bytes,
+    input_l_mat_bytes: bytes,
+    input_r_vec_bytes: bytes,
+    noise_l_mat_bytes: bytes,
+    noise_r_vec_bytes: bytes,
+    state_dim: int,
+    input_dim: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    k = np.frombuffer(k_bytes).reshape(input_dim, state_dim)
+    state_set = Polyhedron(np.frombuffer(state_l_mat_bytes).reshape(-1, state_dim), np.frombuffer(state_r_vec_bytes))
+    input_set = Polyhedron(np.frombuffer(input_l_mat_bytes).reshape(-1, input_dim), np.frombuffer(input_r_vec_bytes))
+
+    disturbance_invariant_set = Polyhedron(
+        *_disturbance_invariant_set(a_k_bytes, noise_l_mat_bytes, noise_r_vec_bytes, state_dim)
+    )
+
+    tightened_state_set = state_set - disturbance_invariant_set
+    tightened_input_set = input_set - k @ disturbance_invariant_set
+
+    return _read_only_h_rep(tightened_state_set) + _read_only_h_rep(tightened_input_set)
+
+
+# 缓存中的数组会被多个控制器共享，设为只读防止被意外修改
+def _read_only_h_rep(poly: Polyhedron) -> Tuple[np.ndarray, np.ndarray]:
+    l_mat, r_vec = poly.l_mat, poly.r_vec
+    l_mat.setflags(write=False)
+    r_vec.setflags(write=False)
+
+    return l_mat, r_vec
@@ -1,3 +1,3 @@
 from .base import support_fun
-from .poly import Polyhedron, rn, unit_cube
+from .poly import Polyhedron, rn, unit_cube, convex_hull
 from .ellipsoid import Ellipsoid
@@ -1,8 +1,12 @@
 import numpy as np
+import numpy.linalg as npl
 import cvxpy as cp
 import matplotlib.pyplot as plt
 import abc
-from typing import Union
+from functools import lru_cache
+from typing import Tuple, Union
+import scipy.sparse as sps
+from scipy.optimize import linprog
 from .exception import *
 
 
@@ -66,8 +70,74 @@ def support_fun(eta: np.ndarray, s: SetBase) -> Union[int, float]:
     if eta.size != s.n_dim:
         raise SetDimensionException("'eta'", "'polyhedron'")
 
+    # 有 H 表示的集合（多面体）的支撑函数只由 eta 和 H 表示决定，转为字节串作为缓存的键，避免重复求解相同的线性规划
+    l_mat, r_vec = getattr(s, "l_mat", None), getattr(s, "r_vec", None)
+    if l_mat is not None and r_vec is not None:
+        return _support_cached(_to_bytes(eta), _to_bytes(l_mat), _to_bytes(r_vec))
+
     var = cp.Variable(s.n_dim)
     prob = cp.Problem(cp.Maximize(eta @ var), [s.contains(var)])
     prob.solve(solver=cp.GLPK)
 
     return prob.value
+
+
+def _to_bytes(arr: np.ndarray) -> bytes:
+    return np.ascontiguousarray(arr, dtype=np.float64).tobytes()
+
+
+@lru_cache(maxsize=4096)
+def _support_cached(eta_bytes: bytes, l_mat_bytes: bytes, r_vec_bytes: bytes) -> Union[int, float]:
+    eta = np.frombuffer(eta_bytes)
+    l_mat = np.frombuffer(l_mat_bytes).reshape(-1, eta.size)
+    r_vec = np.frombuffer(r_vec_bytes)
+
+    return _support_h(eta, l_mat, r_vec)
+
+
+# 多次坐标变换后 l_mat 的元素可能非常大，求解前先将每一行归一化，防止 HiGHS 数值出错
+def _normalize_rows(l_mat: np.ndarray, r_vec: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    row_norm = npl.norm(l_mat, axis=1)
+    row_norm = np.where(row_norm == 0, 1, row_norm)
+
+    return l_mat / row_norm[:, np.newaxis], r_vec / row_norm
+
+
+# 已知多面体的 H 表示 (l_mat, r_vec) 时直接用 HiGHS 求支撑函数，省去 cvxpy 建模的开销
+def _support_h(eta: np.ndarray, l_mat: np.ndarray, r_vec: np.ndarray) -> Union[int, float]:
+    l_mat_bar, r_vec_bar = _normalize_rows(l_mat, r_vec)
+
+    res = linprog(-eta, A_ub=l_mat_bar, b_ub=r_vec_bar, bounds=(None, None), method="highs-ds")
+
+    # status 2 表示多面体为空集，status 3 表示问题无界，其余的数值问题退回用 GLPK 求解
+    if res.status == 0:
+        val = -res.fun
+    elif res.status == 2:
+        val = -float("inf")
+    elif res.status == 3:
+        val = float("inf")
+    else:
+        var = cp.Variable(eta.size)
+        prob = cp.Problem(cp.Maximize(eta @ var), [l_mat @ var <= r_vec])
+        prob.solve(solver=cp.GLPK)
+        val = prob.value
+
+    return val
+
+
+# 同一个多面体在多个方向上的支撑函数（etas 的每一行为一个方向），各个线性规划互不相关，
+# 将它们拼成一个块对角的线性规划一次求解，只需一次 HiGHS 的预处理，每一块的目标函数值即为对应的支撑函数
+def _support_h_batch(etas: np.ndarray, l_mat: np.ndarray, r_vec: np.ndarray) -> np.ndarray:
+    n_etas, n_dim = etas.shape
+    l_mat_bar, r_vec_bar = _normalize_rows(l_mat, r_vec)
+
+    big_l_mat = sps.block_diag([l_mat_bar] * n_etas, format="csr")
+    big_r_vec = np.tile(r_vec_bar, n_etas)
+
+    res = linprog(-etas.ravel(), A_ub=big_l_mat, b_ub=big_r_vec, bounds=(None, None), method="highs-ds")
+
+    # 只要有一个方向无界（或出现数值问题）整个问题就无法给出各块的解，此时退回逐个求解
+    if res.status != 0:
+        return np.array([_support_h(etas[i, :], l_mat, r_vec) for i in range(n_etas)])
+
+    return np.sum(etas * res.x.reshape(n_etas, n_dim), axis=1)
@@ -10,16 +10,32 @@ from .exception import *
 class Ellipsoid(SetBase):
     def __init__(self, p: np.ndarray, alpha: Union[int, float], center: np.ndarray = None):
         try:
-            _ = npl.cholesky(p)
+            l_mat = npl.cholesky(p)
         except npl.LinAlgError:
             raise SetTypeException("'P' matrix", "ellipsoid", "positive definite matrix")
 
         self.__p = p
+        # P 的 Cholesky 分解 P = L @ L.T，判断内点、绘图以及坐标变换时都会用到
+        self.__l = l_mat
         self.__n_dim = p.shape[0]
         self.__alpha = alpha
 
         self.__center = np.zeros(self.__n_dim) if center is None else center
 
+    # 已知 P 的 Cholesky 分解时直接构造椭球，省去重复的分解和正定性检查，仅供内部已知 P 正定的运算使用
+    @classmethod
+    def _from_factor(
+        cls, l_mat: np.ndarray, alpha: Union[int, float], center: np.ndarray = None, p: np.ndarray = None
+    ) -> "Ellipsoid":
+        res = cls.__new__(cls)
+        res.__p = l_mat @ l_mat.T if p is None else p
+        res.__l = l_mat
+        res.__n_dim = l_mat.shape[0]
+        res.__alpha = alpha
+        res.__center = np.zeros(res.__n_dim) if center is None else center
+
+        return res
+
     def __str__(self) -> str:
         return (
             "====================================================================================================\n"
@@ -37,8 +53,11 @@ class Ellipsoid(SetBase):
         )
 
     def contains(self, point: Union[np.ndarray, cp.Expression]) -> Union[bool, cp.Constraint]:
+        # 一维数组表示一个点，二维数组的每一行表示一个点，此时判断是否所有点都在椭球内
         if isinstance(point, np.ndarray):
-            res = np.all((point - self.__center) @ self.__p @ (point - self.__center) - self.__alpha <= 0)
+            # (x - c).T @ P @ (x - c) = ||L.T @ (x - c)||^2
+            y = (point - self.__center) @ self.__l
+            res = np.all(np.sum(y**2, axis=-1) - self.__alpha <= 0)
         else:
             res = cp.quad_form(point - self.__center, self.__p) - self.__alpha <= 0
 
@@ -51,23 +70,12 @@ class Ellipsoid(SetBase):
         if self.__n_dim != 2:
             raise SetPlotException()
 
-        axis_max = np.sqrt(self.__alpha / npl.eigvals(self.__p))
-        x_max, y_max = axis_max * 1.5
-        x_min, y_min = -axis_max * 1.5
+        # 二维椭圆直接用参数方程 x = center + sqrt(alpha) * L^(-T) @ [cos(t), sin(t)] 绘制，其中 P = L @ L.T
+        t = np.linspace(0, 2 * np.pi, n_points)
+        circle = np.sqrt(self.__alpha) * np.vstack((np.cos(t), np.sin(t)))
+        points = self.__center[:, np.newaxis] + npl.solve(self.__l.T, circle)
 
-        x = np.linspace(x_min, x_max, n_points)
-        y = np.linspace(y_min, y_max, n_points)
-        x_grid, y_grid = np.meshgrid(x, y)
-        x_grid = x_grid - self.__center[0]
-        y_grid = y_grid - self.__center[1]
-
-        z = (
-            x_grid**2 * self.__p[0, 0]
-            + x_grid * y_grid * (self.__p[0, 1] + self.__p[1, 0])
-            + y_grid**2 * self.__p[1, 1]
-        )
-
-        ax.contour(x_grid, y_grid, z, levels=[self.__alpha], colors=color)
+        ax.plot(points[0], points[1], color=color)
 
     @property
     def p(self) -> np.ndarray:
@@ -89,7 +97,7 @@ class Ellipsoid(SetBase):
         if isinstance(other, Ellipsoid):
             raise SetNotImplementedException("pontryagin difference", "ellipsoid")
         else:
-            return self.__class__(self.__p, self.__alpha, self.__center + other)
+            return self._from_factor(self.__l, self.__alpha, self.__center + other, self.__p)
 
     def __sub__(self, other: Union["Ellipsoid", np.ndarray]) -> "Ellipsoid":
         if isinstance(other, Ellipsoid):
@@ -103,13 +111,19 @@ class Ellipsoid(SetBase):
         if other.shape[0] != self.__n_dim:
             raise SetCalculationException("ellipsoid", "multiplied", "array with matching dimension")
 
-        return self.__class__(other.T @ self.__p @ other, self.__alpha, self.__center)
+        return self.__from_transformed_factor(self.__l.T @ other)
 
     def __array_ufunc__(self, ufunc, method, *inputs, **kwargs) -> "Ellipsoid":
         if ufunc == np.matmul:
             lhs, rhs = inputs
+            if lhs.ndim != 2:
+                raise SetCalculationException("ellipsoid", "multiplied", "2D array")
+            if lhs.shape[0] != self.__n_dim:
+                raise SetCalculationException("ellipsoid", "multiplied", "array with matching dimension")
+
+            # lhs @ E 即 E @ inv(lhs)，其中 L.T @ inv(lhs) = solve(lhs.T, L).T，解线性方程组而不必显式求逆
             try:
-                res = self.__matmul__(npl.inv(lhs))
+                res = self.__from_transformed_factor(npl.solve(lhs.T, self.__l).T)
             except npl.LinAlgError:
                 res = NotImplemented
         elif ufunc == np.add:
@@ -120,15 +134,36 @@ class Ellipsoid(SetBase):
 
         return res
 
+    # 坐标变换后 P 变为 other.T @ P @ other = (L.T @ other).T @ (L.T @ other)，
+    # 对 L.T @ other 做 QR 分解即可得到新的 Cholesky 分解
+    def __from_transformed_factor(self, l_t_other: np.ndarray) -> "Ellipsoid":
+        # 列数多于行数时 R 不是方阵，变换后的 P 必然奇异
+        if l_t_other.shape[1] > l_t_other.shape[0]:
+            raise SetTypeException("'P' matrix", "ellipsoid", "positive definite matrix")
+
+        r_mat = npl.qr(l_t_other, mode="r")
+        r_diag = np.diag(r_mat)
+
+        # 只用相对的秩判断，尺度很小的椭球同样是合法的
+        if np.any(np.abs(r_diag) <= max(l_t_other.shape) * np.finfo(float).eps * np.max(np.abs(r_diag))):
+            raise SetTypeException("'P' matrix", "ellipsoid", "positive definite matrix")
+
+        return self._from_factor((r_mat * np.sign(r_diag)[:, np.newaxis]).T, self.__alpha, self.__center)
+
     # 多面体的放缩
     def __mul__(self, other: Union[int, float]) -> "Ellipsoid":
         if other < 0:
             raise SetCalculationException("ellipsoid", "multiplied", "positive number")
 
-        return self.__class__(self.__p, self.__alpha * other, self.__center)
+        return self._from_factor(self.__l, self.__alpha * other, self.__center, self.__p)
 
     def __and__(self, other: "Ellipsoid") -> "Ellipsoid":
         raise SetNotImplementedException("intersection", "ellipsoid")
 
     def __eq__(self, other: "Ellipsoid") -> bool:
-        return (self.__center == other.__center) and np.all((self.__p / other.__p) == (self.__alpha / other.__alpha))
+        # P1 / alpha1 == P2 / alpha2 等价于 P1 * alpha2 == P2 * alpha1，避免 P 中零元素带来的除零问题，
+        # 绝对误差随矩阵的大小缩放，使 P 很小时相对误差仍然有效
+        p_self, p_other = self.__p * other.__alpha, other.__p * self.__alpha
+        atol = 1e-12 * max(np.max(np.abs(p_self)), np.max(np.abs(p_other)))
+
+        return np.array_equal(self.__center, other.__center) and np.allclose(p_self, p_other, rtol=1e-12, atol=atol)
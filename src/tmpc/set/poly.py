@@ -3,7 +3,8 @@ import numpy.linalg as npl
 import cvxpy as cp
 import matplotlib.pyplot as plt
 from typing import Union, List
-from .base import SetBase, support_fun
+from scipy.spatial import ConvexHull, HalfspaceIntersection
+from .base import SetBase, support_fun, _support_h_batch
 from .exception import *
 from .ellipsoid import Ellipsoid
 
@@ -13,6 +14,11 @@ class InscribedEllipsoidException(Exception):
         super().__init__("Cannot find a maximum inscribed ellipsoid since the center is not in the polyhedron!")
 
 
+class VertexEnumerationException(Exception):
+    def __init__(self):
+        super().__init__("Cannot find the vertices since the polyhedron is unbounded or has no interior point!")
+
+
 class Polyhedron(SetBase):
     # 用线性不等式组 A @ x <= b 来表示一个多边形
     # n_edges: 边的个数
@@ -98,19 +104,17 @@ class Polyhedron(SetBase):
             y_max = support_fun(np.array([0, 1]), self)
             y_lim = self.get_grid_lim(y_min, y_max, default_bound)
 
-        x = np.linspace(*x_lim, n_points)
-        y = np.linspace(*y_lim, n_points)
+        # 等高线只用来区分点在多面体内外，单精度足够，网格用 float32 存储可以减半内存占用，
+        # 并且逐条边累加，避免生成 (n_edges, n_points, n_points) 大小的临时数组
+        x = np.linspace(*x_lim, n_points, dtype=np.float32)
+        y = np.linspace(*y_lim, n_points, dtype=np.float32)
         x_grid, y_grid = np.meshgrid(x, y)
+        l_mat = self.__l_mat.astype(np.float32)
+        r_vec = self.__r_vec.astype(np.float32)
 
-        z = np.sum(
-            np.maximum(
-                self.__l_mat[:, 0, np.newaxis, np.newaxis] * x_grid
-                + self.__l_mat[:, 1, np.newaxis, np.newaxis] * y_grid
-                - self.__r_vec[:, np.newaxis, np.newaxis],
-                0,
-            ),
-            axis=0,
-        )
+        z = np.zeros_like(x_grid)
+        for i in range(self.__n_edges):
+            z += np.maximum(l_mat[i, 0] * x_grid + l_mat[i, 1] * y_grid - r_vec[i], 0)
 
         ax.contour(x_grid, y_grid, z, levels=0, colors=color)
 
@@ -133,8 +137,14 @@ class Polyhedron(SetBase):
 
         return lim
 
-    def subset_eq(self, other: "Polyhedron") -> bool:
-        return all([support_fun(other.__l_mat[i, :], self) <= other.__r_vec[i] for i in range(other.__n_edges)])
+    # 支撑函数由线性规划数值求解，比较时留出 tol 的余量，防止舍入误差导致不变集等迭代无法终止
+    # 用生成器而不是列表，遇到第一个不满足的边即可停止，不必求解剩余的线性规划
+    def subset_eq(self, other: "Polyhedron", tol=1e-9) -> bool:
+        return all(support_fun(other.__l_mat[i, :], self) <= other.__r_vec[i] + tol for i in range(other.__n_edges))
+
+    # 以本多面体左矩阵的每一行为方向，求另一个多面体的支撑函数，所有方向合并为一个块对角的线性规划一次求解
+    def __support_rows(self, other: "Polyhedron") -> np.ndarray:
+        return _support_h_batch(self.__l_mat, other.__l_mat, other.__r_vec)
 
     # 将不等式组右侧向量归一化，防止系数过大，影响支撑函数（线性规划）求解
     def normalization(self) -> None:
@@ -230,9 +240,12 @@ class Polyhedron(SetBase):
 
     # 闵可夫斯基和（或平移）
     def __add__(self, other: Union["Polyhedron", np.ndarray]) -> "Polyhedron":
-        if isinstance(other, Polyhedron):
-            h_self_other = np.array([support_fun(self.__l_mat[i, :], other) for i in range(self.__n_edges)])
-            h_other_self = np.array([support_fun(other.__l_mat[i, :], self) for i in range(other.__n_edges)])
+        if isinstance(other, Polyhedron) and self.__is_homothetic(other):
+            res = self.__class__(self.__l_mat, self.__r_vec + other.__r_vec)
+
+        elif isinstance(other, Polyhedron):
+            h_self_other = self.__support_rows(other)
+            h_other_self = other.__support_rows(self)
 
             res_l_mat = np.vstack((self.__l_mat, other.__l_mat))
             res_r_vec = np.hstack((self.__r_vec + h_self_other, other.__r_vec + h_other_self))
@@ -252,14 +265,36 @@ class Polyhedron(SetBase):
 
         return res
 
+    # 左矩阵相同且右侧向量成非负比例时，两个多面体互为放缩（右侧向量为零时是同一个锥），
+    # 此时闵可夫斯基和恰为 {x : l_mat @ x <= r_vec_1 + r_vec_2}，不需要求解支撑函数
+    # 注意仅左矩阵相同时该式一般只是闵可夫斯基和的外近似
+    def __is_homothetic(self, other: "Polyhedron") -> bool:
+        if self.__l_mat.shape != other.__l_mat.shape or not np.array_equal(self.__l_mat, other.__l_mat):
+            return False
+
+        norm_self, norm_other = npl.norm(self.__r_vec), npl.norm(other.__r_vec)
+        if norm_self == 0 or norm_other == 0:
+            return True
+
+        return np.allclose(self.__r_vec / norm_self, other.__r_vec / norm_other, rtol=0, atol=1e-12)
+
     def __neg__(self) -> "Polyhedron":
         return self.__class__(-self.__l_mat, self.__r_vec)
 
     # 特别的，这里指庞特里亚金差，即闵可夫斯基和的逆运算
     # 即若 p2 = p1 + p3，则 p3 = p2 - p1，只有当输入为一个点（数组）时该运算等价于 (-p1) + p2
     def __sub__(self, other: Union["Polyhedron", np.ndarray]) -> "Polyhedron":
-        if isinstance(other, Polyhedron):
-            h_self_other = np.array([support_fun(self.__l_mat[i, :], other) for i in range(self.__n_edges)])
+        # 互为放缩且 other 不大于 self 时，庞特里亚金差恰为 {x : l_mat @ x <= r_vec_1 - r_vec_2}
+        if (
+            isinstance(other, Polyhedron)
+            and self.__is_homothetic(other)
+            and npl.norm(other.__r_vec) <= npl.norm(self.__r_vec)
+        ):
+            res = self.__class__(self.__l_mat, self.__r_vec - other.__r_vec)
+            res.normalization()
+
+        elif isinstance(other, Polyhedron):
+            h_self_other = self.__support_rows(other)
 
             res = self.__class__(self.__l_mat, self.__r_vec - h_self_other)
             res.remove_redundant_term()
@@ -328,6 +363,24 @@ class Polyhedron(SetBase):
 
         return Ellipsoid(p, min_center_to_edge_distance**2, center)
 
+    # 求有界多面体的所有顶点，要求多面体有内点，这里以切比雪夫中心作为内点
+    def get_vertices(self) -> np.ndarray:
+        if self.__n_dim == 1:
+            return np.array([[-support_fun(np.array([-1]), self)], [support_fun(np.array([1]), self)]])
+
+        center = cp.Variable(self.__n_dim)
+        radius = cp.Variable()
+        row_norm = npl.norm(self.__l_mat, ord=2, axis=1)
+        prob = cp.Problem(cp.Maximize(radius), [self.__l_mat @ center + radius * row_norm <= self.__r_vec])
+        prob.solve(solver=cp.GLPK)
+
+        if prob.status != cp.OPTIMAL or radius.value <= 0:
+            raise VertexEnumerationException
+
+        halfspaces = np.hstack((self.__l_mat, -self.__r_vec[:, np.newaxis]))
+
+        return HalfspaceIntersection(halfspaces, center.value).intersections
+
 
 def rn(dim: int):
     return Polyhedron(np.zeros((1, dim)), np.zeros(1))
@@ -342,3 +395,19 @@ def unit_cube(dim: int, side_length: Union[int, float]):
     eye = np.eye(dim)
 
     return Polyhedron(np.vstack((eye, -eye)), (side_length / 2) * np.ones(2 * dim))
+
+
+# 由一组点（每行一个点）的凸包生成多面体
+def convex_hull(points: np.ndarray) -> Polyhedron:
+    if points.ndim != 2:
+        raise SetTypeException("points", "convex hull", "2D array")
+
+    if points.shape[1] == 1:
+        return Polyhedron(np.array([[1.0], [-1.0]]), np.array([np.max(points), -np.min(points)]))
+
+    # ConvexHull 给出的超平面为 normal @ x + offset <= 0，高维时同一个面会被三角化成多个相同的超平面，需要去重
+    equations = ConvexHull(points).equations
+    _, index = np.unique(np.round(equations, 10), axis=0, return_index=True)
+    equations = equations[np.sort(index)]
+
+    return Polyhedron(equations[:, :-1], -equations[:, -1])
@@ -0,0 +1,120 @@
+import numpy as np
+import tmpc.set as ts
+import tmpc.mpc as tm
+from tmpc.set.base import _support_h_batch
+from tmpc.set.exception import SetTypeException
+
+if __name__ == "__main__":
+    # Homothetic polyhedra = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = =
+    big_cube = ts.unit_cube(2, 2)
+    small_cube = ts.unit_cube(2, 1)
+
+    # 行顺序不同的同一个多面体不会走放缩的快速路径，用于对照
+    small_cube_perm = ts.Polyhedron(small_cube.l_mat[::-1], small_cube.r_vec[::-1])
+
+    p_sum = big_cube + small_cube
+    p_diff = big_cube - small_cube
+
+    assert p_sum == ts.unit_cube(2, 3)
+    assert p_diff == ts.unit_cube(2, 1)
+    assert p_sum == big_cube + small_cube_perm
+    assert p_diff == big_cube - small_cube_perm
+
+    # Batched support function = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = =
+    # 多个方向一次求解的结果应与逐个求解一致，方向 [0, 1]、[1, 1] 无界，此时退回逐个求解
+    strip = ts.Polyhedron(np.array([[1, 0], [-1, 0], [0, -1], [-1, -1]]), np.array([1, 1, 0, 1]))
+    etas = np.array([[1, 0], [0, -1], [-1, -2], [0, 1], [1, 1]])
+    h_batch = _support_h_batch(etas, strip.l_mat, strip.r_vec)
+    assert np.isinf(h_batch[3]) and np.isinf(h_batch[4])
+    assert np.allclose(h_batch, [ts.support_fun(eta, strip) for eta in etas])
+    assert np.allclose(_support_h_batch(etas[:3], strip.l_mat, strip.r_vec), h_batch[:3])
+
+    # Vertices and convex hull = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = =
+    # 由顶点求凸包应得到原来的多面体，三维长方体的每个面会被 ConvexHull 三角化，检查去重
+    box = ts.Polyhedron(np.vstack((np.eye(3), -np.eye(3))), np.array([1, 2, 3, 1, 2, 3]))
+    assert box.get_vertices().shape == (8, 3)
+    assert ts.convex_hull(box.get_vertices()) == box
+
+    theta = np.deg2rad(30)
+    rot_mat = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+    polygon = ts.Polyhedron(np.array([[-3, 1], [-1, -1], [1, 0], [0, 1]]), np.array([3, 1, 1, 2])) @ rot_mat
+    assert polygon.get_vertices().shape == (4, 2)
+    assert ts.convex_hull(polygon.get_vertices()) == polygon
+
+    interval = ts.Polyhedron(np.array([[2], [-1]]), np.array([3, 1]))
+    assert np.allclose(np.sort(interval.get_vertices(), axis=0), np.array([[-1], [1.5]]))
+    assert ts.convex_hull(interval.get_vertices()) == interval
+
+    # Ellipsoid = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = =
+    e1 = ts.Ellipsoid(np.eye(2), 1)
+
+    # 二维数组的每一行是一个点，所有点都在椭球内时才返回 True，结果应与逐点判断一致
+    points = np.array([[0.5, 0.5], [-0.6, 0.7], [0, -1]])
+    assert e1.contains(points) == all(e1.contains(point) for point in points)
+    assert e1.contains(points[:2])
+    assert not e1.contains(points + np.array([0, 0.5]))
+
+    # 列数多于维数的变换得到的 P 奇异，不是椭球
+    try:
+        e1 @ np.array([[1, 0, 1], [0, 1, 2]])
+    except SetTypeException:
+        pass
+    else:
+        raise AssertionError("singular transformation of ellipsoid did not raise")
+
+    # 尺度很小的椭球经过可逆变换后仍是椭球
+    e_small = ts.Ellipsoid(np.eye(2) * 1e-33, 1)
+    assert e_small @ np.eye(2) == e_small
+    assert (2 * np.eye(2)) @ e_small == ts.Ellipsoid(np.eye(2) * 2.5e-34, 1)
+
+    # P 中有零元素或 P 很小时，相等的判断仍按相对误差进行
+    assert e1 == ts.Ellipsoid(2 * np.eye(2), 2)
+    assert ts.Ellipsoid(np.eye(2) * 1e-9, 1) != ts.Ellipsoid(np.eye(2) * 5e-9, 1)
+    assert ts.Ellipsoid(np.eye(2), 1, np.array([1, 2])) != ts.Ellipsoid(np.eye(2), 1, np.array([1, 3]))
+
+    # Disturbance invariant set = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = = =
+    A = np.array([[1, 1], [0, 1]])
+    B = np.array([[0.5], [1]])
+    Q = np.array([[1, 0], [0, 1]])
+    R = np.array([[0.01]])
+
+    x_set = ts.Polyhedron(np.array([[0, 1]]), np.array([2]))
+    u_set = ts.Polyhedron(np.array([[1], [-1]]), np.array([1, 1]))
+    w_set = ts.Polyhedron(np.array([[1, 0], [-1, 0], [0, 1], [0, -1]]), np.array([0.1, 0.1, 0.1, 0.1]))
+
+    t_mpc = tm.TubeBasedMPC(A, B, Q, R, 9, x_set, u_set, w_set)
+    z_set = t_mpc.disturbance_invariant_set
+    a_k = A - B @ t_mpc.k
+
+    # 鲁棒不变性：A_k @ Z + W 被包含于 Z，直接在顶点上检查
+    z_vertices, w_vertices = z_set.get_vertices(), w_set.get_vertices()
+    h_a_k_z = np.max(z_set.l_mat @ a_k @ z_vertices.T, axis=1)
+    h_w = np.max(z_set.l_mat @ w_vertices.T, axis=1)
+    assert np.all(h_a_k_z + h_w <= z_set.r_vec + 1e-9)
+
+    # 与 H 表示的迭代构造对照：用多面体运算确定 s、alpha 和 m，
+    # 再由 h(eta, M @ S) = h(M.T @ eta, S) 求 Z = A_k^(m + 1) @ F_s / (1 - alpha) + sum(A_k^i @ W) 的支撑函数
+    a_k_powers = [np.eye(2)]
+    a_k_s_w_set = w_set
+    while not a_k_s_w_set.subset_eq(0.2 * w_set):
+        a_k_s_w_set = a_k @ a_k_s_w_set
+        a_k_powers.append(a_k @ a_k_powers[-1])
+
+    s = len(a_k_powers) - 1
+    alp = max(ts.support_fun(w_set.l_mat[i, :], a_k_s_w_set) / a_k_s_w_set.r_vec[i] for i in range(w_set.n_edges))
+
+    unit_cube_ = ts.unit_cube(2, 2 * 0.001 / np.sqrt(2))
+    a_k_n_w_set = a_k_s_w_set
+    while not a_k_n_w_set.subset_eq(unit_cube_):
+        a_k_n_w_set = a_k @ a_k_n_w_set
+        a_k_powers.append(a_k @ a_k_powers[-1])
+
+    m = len(a_k_powers) - 1
+    a_k_n = a_k @ a_k_powers[-1]
+
+    for eta in np.vstack((w_set.l_mat, z_set.l_mat)):
+        h_ref = sum(ts.support_fun(a_k_i.T @ eta, w_set) for a_k_i in a_k_powers[: m + 1])
+        h_ref += sum(ts.support_fun((a_k_n @ a_k_i).T @ eta, w_set) for a_k_i in a_k_powers[: s + 1]) / (1 - alp)
+        assert abs(ts.support_fun(eta, z_set) - h_ref) <= 1e-6
+
+    print("All checks passed.")